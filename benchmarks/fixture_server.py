@@ -0,0 +1,80 @@
+# fixture_server.py
+"""
+Serves a recorded copy of the Ken French data library from a local directory,
+so getFamaFrenchFactors can be exercised and benchmarked without network access.
+
+The directory mirrors the site: data_library.html at the top and the zipped
+factor files under ftp/ (see record_fixtures.py). Every request can be delayed
+by a fixed latency to mimic a remote server. Last-Modified/If-Modified-Since
+revalidation works as on the real site, so the on-disk cache sees 304s.
+
+Usage:
+    python benchmarks/fixture_server.py FIXTURE_DIR [--port 8000] [--latency 0.2]
+
+Then point the module at it:
+    gff.url = 'http://localhost:8000/data_library.html'
+    gff.home_url = 'http://localhost:8000/'
+"""
+
+import argparse
+import contextlib
+import functools
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    '''
+    Static file handler that waits latency seconds before each response
+    '''
+    latency = 0.0
+
+    def send_head(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+@contextlib.contextmanager
+def serve(fixture_dir, port=0, latency=0.0):
+    '''
+    Serves fixture_dir in a background thread and yields the base URL
+
+    port=0 picks a free port.
+    '''
+    handler = functools.partial(type('Handler', (FixtureHandler,),
+                                     {'latency' : latency}),
+                                directory=fixture_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('fixture_dir')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds to wait before each response')
+    args = parser.parse_args()
+
+    with serve(args.fixture_dir, args.port, args.latency) as base_url:
+        print('Serving {} at {}'.format(args.fixture_dir, base_url))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# record_fixtures.py
+"""
+Records the Ken French data library page and every factor file the module
+uses into a local directory, for fixture_server.py to serve.
+
+Usage:
+    python benchmarks/record_fixtures.py FIXTURE_DIR
+"""
+
+import argparse
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import getFamaFrenchFactors as gff  # noqa: E402
+
+
+def record(fixture_dir):
+    '''
+    Downloads the data library page and its factor CSV files into
+    fixture_dir, keeping the site's relative paths
+    '''
+    os.makedirs(fixture_dir, exist_ok=True)
+    page = requests.get(gff.url, timeout=gff.request_timeout)
+    page.raise_for_status()
+    with open(os.path.join(fixture_dir, 'data_library.html'), 'wb') as fh:
+        fh.write(page.content)
+
+    links = gff._scrape_factor_links()
+    for factor in links.values():
+        for file_url in factor['csv_links']:
+            relative_path = file_url[len(gff.home_url):]
+            path = os.path.join(fixture_dir, *relative_path.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            response = requests.get(file_url, timeout=gff.request_timeout)
+            response.raise_for_status()
+            with open(path, 'wb') as fh:
+                fh.write(response.content)
+            print('Recorded {} ({} bytes)'.format(relative_path, len(response.content)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('fixture_dir')
+    record(parser.parse_args().fixture_dir)
+
+
+if __name__ == '__main__':
+    main()
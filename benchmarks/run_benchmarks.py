@@ -0,0 +1,156 @@
+# run_benchmarks.py
+"""
+Benchmarks every phase of loading factors against a local fixture server,
+so load latency can be compared between versions without network access.
+
+Measured:
+    * import time of the module (fresh interpreter)
+    * scraping the factor links from data_library.html
+    * downloading each factor file, cold and revalidated (304)
+    * parsing each file into its sections
+    * every public loader at 'd', 'm' and 'a', cold (empty cache) and warm
+      (file cached on disk, nothing parsed in memory)
+    * getFactors() for every model and frequency at once
+
+Each result is the best wall-clock time of --repeat runs, with the peak
+memory traced by tracemalloc during one run.
+
+Usage:
+    python benchmarks/run_benchmarks.py FIXTURE_DIR [--latency 0.1] [--repeat 3] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fixture_server import serve
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+import getFamaFrenchFactors as gff  # noqa: E402
+
+loaders = ['famaFrench3Factor', 'momentumFactor', 'carhart4Factor', 'famaFrench5Factor']
+
+
+def measure(fn, setup=None, repeat=3):
+    '''
+    Returns (best seconds, peak traced bytes) of fn(), calling setup()
+    before every run
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def import_time(repeat):
+    '''
+    Times importing the module in a fresh interpreter, without its imports
+    of pandas and friends
+    '''
+    code = ('import time, numpy, pandas, requests, bs4\n'
+            'start = time.perf_counter()\n'
+            'import getFamaFrenchFactors\n'
+            'print(time.perf_counter() - start)\n')
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    runs = [float(subprocess.check_output([sys.executable, '-c', code], env=env))
+            for _ in range(repeat)]
+    return min(runs), None
+
+
+def empty_cache():
+    gff.clearCache()
+
+
+def forget_parsed():
+    gff._parsed.clear()
+
+
+def run(fixture_dir, latency, repeat):
+    results = []
+
+    def record(name, timing):
+        seconds, peak = timing
+        results.append({'benchmark' : name, 'seconds' : seconds,
+                         'peak_bytes' : peak})
+        peak_text = '' if peak is None else '{:10.1f} MiB'.format(peak / 2 ** 20)
+        print('{:<40}{:10.4f} s{}'.format(name, seconds, peak_text))
+
+    with tempfile.TemporaryDirectory() as cache, \
+            serve(fixture_dir, latency=latency) as base_url:
+        gff.cache_dir = cache
+        gff.url = base_url + 'data_library.html'
+        gff.home_url = base_url
+        gff.offline = False
+
+        record('import', import_time(repeat))
+        record('scrape links', measure(gff._scrape_factor_links, repeat=repeat))
+
+        files = {}
+        for dataset in gff._datasets:
+            for frequency in ('d', 'm'):
+                files['{} {}'.format(dataset, 'daily' if frequency == 'd' else 'monthly')] = (
+                    gff._file_url(dataset, frequency))
+
+        for name, file_url in files.items():
+            record('download {} (cold)'.format(name),
+                   measure(lambda: gff._download(file_url), empty_cache, repeat))
+            gff.cache_ttl = 0  # Every read revalidates
+            record('download {} (304)'.format(name),
+                   measure(lambda: gff._download(file_url), repeat=repeat))
+            gff.cache_ttl = 24 * 60 * 60
+            raw_data = gff._download(file_url)
+            record('parse {}'.format(name),
+                   measure(lambda: gff._parse_factor_file(raw_data), repeat=repeat))
+
+        for loader in loaders:
+            fn = getattr(gff, loader)
+            for frequency in ('d', 'm', 'a'):
+                call = lambda: fn(frequency)  # noqa: E731
+                record('{}({!r}) cold'.format(loader, frequency),
+                       measure(call, empty_cache, repeat))
+                record('{}({!r}) warm'.format(loader, frequency),
+                       measure(call, forget_parsed, repeat))
+
+        every_model = lambda: gff.getFactors(list(gff._models), ['d', 'm', 'a'])  # noqa: E731
+        record('getFactors(all) cold', measure(every_model, empty_cache, repeat))
+        record('getFactors(all) warm', measure(every_model, forget_parsed, repeat))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('fixture_dir')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the fixture server waits per request')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = run(os.path.abspath(args.fixture_dir), args.latency, args.repeat)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
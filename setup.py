@@ -4,7 +4,7 @@ with open("README.md", "r", encoding='utf-8') as fh:
     long_description = fh.read()
 
 setup(name='getFamaFrenchFactors',
-      version='0.0.5',
+      version='0.0.7',
       description='Returns Fama French Factors as a Pandas Dataframe',
       long_description = long_description,
       long_description_content_type="text/markdown",
@@ -20,9 +20,13 @@ setup(name='getFamaFrenchFactors',
       py_modules=['getFamaFrenchFactors'],
       package_dir={'': 'src'},
       install_requires=[
+          'numpy',
           'pandas',
           'requests',
           'bs4'
       ],
+      extras_require={
+          'store': ['pyarrow'],
+      },
       include_package_data=True,
       zip_safe=False)
@@ -1,8 +1,8 @@
 # getFamaFrenchFactors.py
 # Author: Vash
 # Modified by Valentyn Panchenko
-# Version 0.0.6
-# Last updated: 27 October 2023
+# Version 0.0.7
+# Last updated: 17 October 2026
 
 """
 This programme gets cleaned versions of factors including:
@@ -18,6 +18,28 @@ frequency take values:
 'a' annual
 
 
+Updates in Version 0.0.7:
+Factor links are scraped lazily on first use and cached on disk
+(see cache_dir and link_cache_ttl) instead of at import time
+Downloaded factor files are cached on disk and revalidated with
+ETag/Last-Modified (see cache_ttl, cache_max_bytes, offline and clearCache)
+Monthly and annual factors are parsed from one download and memoised together
+Factor files are parsed by a single section-aware parser with vectorised dates
+Missing values coded -99.99 or -999 in the files are now NaN, where they
+used to come out as -0.9999 and -9.99; invalid dates raise ValueError
+getFactors() loads several models and frequencies with concurrent downloads
+resampleFactors() and deriveFactors() compound daily factors into weekly,
+monthly, quarterly and (fiscal) annual factors
+refreshFactors() keeps a local Parquet history up to date incrementally, and
+readFactorStore() reads it back
+factorRegression() estimates alphas and betas for many assets in one batch
+rollingFactorBetas() and RollingFactorRegression give rolling and expanding
+window betas, updated incrementally
+publishFactorPanel() and attachFactorPanel() share loaded factors between
+processes through memory-mapped arrays
+addTimingCallback() and profileLoads() report the time, bytes, cache use and
+rows of each phase of a load
+
 Updates in Version 0.0.6:
 Adds support for daily data in addition to annual and monthly data
 DataFrame "date_ff_factors" field changed to more conventional "Date"
@@ -30,108 +52,641 @@ Updates in Version 0.0.3:
 Adds support for annual data in addition to monthly data.
 """
 
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
-from dateutil.relativedelta import relativedelta
 import requests
 from bs4 import BeautifulSoup
+from urllib3.util.retry import Retry
 
-# Extract URLs to download
+# Page the factor URLs are scraped from
 url = "http://mba.tuck.dartmouth.edu/pages/faculty/ken.french/data_library.html"
-response = requests.get(url)
-soup = BeautifulSoup(response.text, 'lxml')
+home_url = "http://mba.tuck.dartmouth.edu/pages/faculty/ken.french/"
 
-text_to_search = ['Fama/French 3 Factors', 'Momentum Factor (Mom)']
-all_factors_text = soup.findAll('b', string=text_to_search)
+# Scraped links are kept on disk so the page is fetched at most once per TTL
+cache_dir = os.environ.get(
+    'GFF_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'getFamaFrenchFactors'))
+link_cache_ttl = 24 * 60 * 60  # seconds
 
-home_url = "http://mba.tuck.dartmouth.edu/pages/faculty/ken.french/"
-all_factor_links = []
-for text in all_factors_text:
-    links_for_factor = []  # Stores all links for a factor
-    for sib in text.next_siblings:  # Find next element
-        # URLs are stored in bold tags, hence...
-        if sib.name == 'b':
-            bold_tags = sib
+# Downloaded factor files are cached in cache_dir/files and revalidated
+# with ETag/Last-Modified once they are older than cache_ttl
+cache_ttl = 24 * 60 * 60  # seconds
+cache_max_bytes = 512 * 1024 * 1024  # least recently used files are evicted
+offline = os.environ.get('GFF_OFFLINE', '') not in ('', '0')  # cache only
+
+# HTTP settings shared by every request
+request_timeout = 60  # seconds
+request_retries = 3
+max_workers = 8  # concurrent downloads in getFactors()
+
+_session = None
+_session_settings = None
+_factor_links = None
+_links_lock = threading.Lock()
+_session_lock = threading.Lock()
+
+# Functions called with a timing event after each phase of a load
+_timing_callbacks = []
+
+
+def addTimingCallback(callback):
+    '''
+    Registers callback(event) to be called after every phase of a load
+
+    event is a dict with 'phase' and 'seconds', plus whichever of 'dataset',
+    'frequency', 'url', 'bytes', 'cache' and 'rows' apply. Phases are:
+        'links' -- resolving the factor links; cache is 'memory', 'disk',
+                   'miss' (page scraped, bytes is its size) or 'stale'
+        'download' -- fetching a file; cache is 'hit', 'revalidated',
+                      'miss' or 'stale', bytes is what crossed the network
+        'decompress' -- unzipping and splitting a file into sections
+                        (bytes uncompressed)
+        'parse' -- parsing one section's rows into floats
+        'dates' -- converting one section's dates
+        'load' -- a whole dataset load; cache is 'memory' or 'miss'
+        'merge' -- joining 3 factor and momentum data for carhart4
+    A phase that fails still reports, with 'error' set to the exception.
+    Callbacks run in the loading thread. 'links' and 'load' events are sent
+    once their locks are released, so those callbacks may load factors;
+    the file phases are reported while that file is locked, so their
+    callbacks must not load the same dataset. With none registered the
+    hooks cost next to nothing.
+    '''
+    _timing_callbacks.append(callback)
+
+
+def removeTimingCallback(callback):
+    '''
+    Unregisters a callback added with addTimingCallback()
+    '''
+    _timing_callbacks.remove(callback)
+
+
+@contextlib.contextmanager
+def profileLoads():
+    '''
+    Collects the timing events of all loads inside the block into a list
+
+        with gff.profileLoads() as events:
+            gff.famaFrench5Factor('d')
+    '''
+    events = []
+    addTimingCallback(events.append)
+    try:
+        yield events
+    finally:
+        removeTimingCallback(events.append)
+
+
+@contextlib.contextmanager
+def _timed(phase, **fields):
+    '''
+    Times the block and passes the event to the timing callbacks
+
+    The block can add fields to the yielded event dict. If the block
+    raises, the event is still sent, with an 'error' field describing the
+    exception, and the exception propagates.
+    '''
+    event = fields
+    if not _timing_callbacks:
+        yield event
+        return
+
+    start = time.perf_counter()
+    try:
+        yield event
+    except BaseException as error:
+        event['error'] = '{}: {}'.format(type(error).__name__, error)
+        raise
+    finally:
+        event['phase'] = phase
+        event['seconds'] = time.perf_counter() - start
+        for callback in tuple(_timing_callbacks):
+            callback(event)
+
+
+def _get_session():
+    '''
+    Returns the pooled HTTP session, retrying transient server errors
+
+    The session is built again whenever request_retries or max_workers
+    has changed since it was last built.
+    '''
+    global _session, _session_settings
+
+    settings = (request_retries, max_workers)
+    with _session_lock:
+        if _session is None or _session_settings != settings:
+            retries = Retry(total=request_retries, backoff_factor=0.5,
+                            status_forcelist=(500, 502, 503, 504))
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=max_workers, pool_maxsize=max_workers,
+                max_retries=retries)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+            _session_settings = settings
+        return _session
+
+
+def _write_atomic(path, data):
+    '''
+    Writes bytes to path so concurrent readers never see a partial file
+    '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _scrape_factor_links(event=None):
+    '''
+    Scrapes the data library page for the CSV and TXT links of each factor
+
+    The size of the page is recorded in event, if given.
+    '''
+    response = _get_session().get(url, timeout=request_timeout)
+    response.raise_for_status()
+    if event is not None:
+        event['bytes'] = len(response.content)
+    soup = BeautifulSoup(response.text, 'lxml')
+
+    text_to_search = ['Fama/French 3 Factors', 'Momentum Factor (Mom)']
+    all_factors_text = soup.findAll('b', string=text_to_search)
+
+    all_factor_links = []
+    for text in all_factors_text:
+        links_for_factor = []  # Stores all links for a factor
+        for sib in text.next_siblings:  # Find next element
+            # URLs are stored in bold tags, hence...
+            if sib.name == 'b':
+                bold_tags = sib
+                try:
+                    link = bold_tags.find('a')['href']
+                    links_for_factor.append(link)
+                except TypeError:
+                    pass
+        csv_links = [home_url + link for link in links_for_factor if 'csv' in link.lower()]
+        txt_links = [home_url + link for link in links_for_factor if 'txt' in link.lower()]
+        factor_dict = {'factor' : text.get_text(), 'csv_links' : csv_links, 'txt_links' : txt_links}
+        all_factor_links.append(factor_dict)
+
+    return {'ff' : all_factor_links[0], 'mom' : all_factor_links[1]}
+
+
+def _get_factor_links():
+    '''
+    Returns the scraped factor links, resolving them on first use
+
+    Links are memoised in-process and persisted to cache_dir, and are only
+    scraped again once they are older than link_cache_ttl seconds.
+    '''
+    # The lock is released before the event is sent, so callbacks never
+    # hold up other loads and may load factors themselves
+    with _timed('links', url=url, bytes=0) as event, _links_lock:
+        return _resolve_factor_links(event)
+
+
+def _resolve_factor_links(event):
+    global _factor_links
+
+    now = time.time()
+    event['cache'] = 'memory'
+    if _factor_links is not None and now - _factor_links['scraped_at'] < link_cache_ttl:
+        return _factor_links
+
+    event['cache'] = 'disk'
+    stale = _factor_links
+
+    manifest_path = os.path.join(cache_dir, 'factor_links.json')
+    manifest = _read_json(manifest_path)
+    if manifest is not None and 'scraped_at' in manifest:
+        # Offline mode trusts whatever manifest is on disk
+        if offline or now - manifest['scraped_at'] < link_cache_ttl:
+            _factor_links = manifest
+            return _factor_links
+        if stale is None or manifest['scraped_at'] > stale['scraped_at']:
+            stale = manifest
+    if offline:
+        raise FileNotFoundError(
+            'Factor links are not cached in {} and offline is set'.format(cache_dir))
+
+    event['cache'] = 'miss'
+    try:
+        manifest = _scrape_factor_links(event)
+    except requests.exceptions.RequestException:
+        if stale is None:
+            raise
+        # Stale links beat no links, as for the files themselves
+        event['cache'] = 'stale'
+        _factor_links = stale
+        return _factor_links
+    manifest['scraped_at'] = now
+
+    try:
+        _write_atomic(manifest_path, json.dumps(manifest).encode('utf-8'))
+    except OSError:
+        pass  # Cache is best effort; a read-only home still works
+
+    _factor_links = manifest
+    return _factor_links
+
+
+def _evict_cache(keep):
+    '''
+    Removes least recently used files until the cache fits cache_max_bytes
+    '''
+    files_dir = os.path.join(cache_dir, 'files')
+    entries = []
+    for entry in os.scandir(files_dir):
+        if entry.name.endswith('.json') or entry.name.endswith('.tmp'):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue  # Removed by another process meanwhile
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= cache_max_bytes:
+            break
+        if path == keep:
+            continue
+        for stale in (path, path + '.json'):
             try:
-                link = bold_tags.find('a')['href']
-                links_for_factor.append(link)
-            except TypeError:
+                os.remove(stale)
+            except OSError:
                 pass
-    csv_links = [home_url + link for link in links_for_factor if 'csv' in link.lower()]
-    txt_links = [home_url + link for link in links_for_factor if 'txt' in link.lower()]
-    factor_dict = {'factor' : text, 'csv_links' : csv_links, 'txt_links' : txt_links}
-    all_factor_links.append(factor_dict)
+        total -= size
 
-ff_factor_dict = dict(all_factor_links[0])
-momAndOthers_dict = dict(all_factor_links[1])
 
+def _download(file_url):
+    '''
+    Returns the raw bytes of file_url, going through the on-disk cache
 
-def famaFrench3Factor(frequency='d'):
+    Fresh copies (younger than cache_ttl) are served without touching the
+    network. Stale copies are revalidated with If-None-Match and
+    If-Modified-Since, so an unchanged file costs a 304 and no body. With
+    offline set only the cache is used.
     '''
-    Returns Fama French 3 factors (Market Risk Premium, SMB, HML)
+    with _timed('download', url=file_url, bytes=0) as event:
+        return _fetch(file_url, event)
 
-    Set frequency as:
-        'd' for daily factors
-        'm' for monthly factors
-        'a' for annual factors
 
+def _fetch(file_url, event):
+    key = hashlib.sha1(file_url.encode('utf-8')).hexdigest()
+    data_path = os.path.join(cache_dir, 'files', key)
+    meta_path = data_path + '.json'
+
+    meta = _read_json(meta_path)
+    cached = meta is not None and os.path.exists(data_path)
+
+    def from_cache():
+        # Reading counts as a use for LRU eviction
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass  # e.g. a shared cache this process cannot write to
+        with open(data_path, 'rb') as fh:
+            return fh.read()
+
+    now = time.time()
+    if cached and (offline or now - meta['fetched_at'] < cache_ttl):
+        event['cache'] = 'hit'
+        return from_cache()
+    if offline:
+        raise FileNotFoundError(
+            '{} is not cached in {} and offline is set'.format(file_url, cache_dir))
+
+    headers = {}
+    if cached and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if cached and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        response = _get_session().get(file_url, headers=headers,
+                                      timeout=request_timeout)
+    except requests.exceptions.RequestException:
+        if cached:
+            event['cache'] = 'stale'
+            return from_cache()  # Stale data beats no data
+        raise
+
+    if response.status_code == 304 and cached:
+        event['cache'] = 'revalidated'
+        meta['fetched_at'] = now
+        try:
+            _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+        except OSError:
+            pass
+        return from_cache()
+    response.raise_for_status()
+
+    data = response.content
+    event['cache'] = 'miss'
+    event['bytes'] = len(data)
+    meta = {'url' : file_url,
+            'etag' : response.headers.get('ETag'),
+            'last_modified' : response.headers.get('Last-Modified'),
+            'fetched_at' : now,
+            'size' : len(data)}
+    try:
+        _write_atomic(data_path, data)
+        _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+        _evict_cache(keep=data_path)
+    except OSError:
+        pass
+    return data
+
+
+def clearCache():
     '''
-    rows_to_skip = 3
+    Deletes every cached factor file, the cached factor links and any
+    factors already parsed in this process
+    '''
+    global _factor_links
+
+    _factor_links = None
+    with _parsed_lock:
+        _parsed.clear()
+    files_dir = os.path.join(cache_dir, 'files')
+    paths = [os.path.join(cache_dir, 'factor_links.json')]
+    if os.path.isdir(files_dir):
+        paths += [entry.path for entry in os.scandir(files_dir)]
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
+
+def __getattr__(name):
+    # Keep the old module-level dicts available without scraping on import
+    if name == 'ff_factor_dict':
+        return _get_factor_links()['ff']
+    if name == 'momAndOthers_dict':
+        return _get_factor_links()['mom']
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# File index within the scraped csv_links for each dataset and frequency.
+# Monthly and annual factors share one file, split into sections on parsing.
+_datasets = {
+    'ff3' : {'links' : 'ff', 'files' : {'d' : 2, 'm' : 0, 'a' : 0}},
+    'mom' : {'links' : 'mom', 'files' : {'d' : 1, 'm' : 0, 'a' : 0},
+             'columns' : {'Mom' : 'MOM'}},
+    'ff5' : {'links' : 'ff', 'files' : {'d' : 4, 'm' : 3, 'a' : 3}},
+}
+
+# Factor models made up of one or more datasets
+_models = {
+    'ff3' : ['ff3'],
+    'mom' : ['mom'],
+    'carhart4' : ['ff3', 'mom'],
+    'ff5' : ['ff5'],
+}
+
+# Parsed sections keyed by (dataset, frequency), as (parsed_at, DataFrame)
+_parsed = {}
+# One lock per file URL, so a file is never downloaded twice concurrently
+_file_locks = {}
+_parsed_lock = threading.Lock()
+
+
+# Width of the date field tells the frequency of a section
+_date_widths = {8 : 'd', 6 : 'm', 4 : 'a'}
+
+
+def _period_end_dates(date_codes, frequency):
+    '''
+    Converts integer dates (YYYYMMDD, YYYYMM or YYYY) to the last day of
+    the period with plain datetime64 arithmetic, without per-row calls
+    '''
     if frequency == 'd':
-        ff3_raw_data = ff_factor_dict['csv_links'][2]
-        ff3_factors = pd.read_csv(ff3_raw_data, skiprows=rows_to_skip)
-        ff3_factors.rename(columns={ff3_factors.columns[0]: 'Date'},
-                           inplace=True)
-        # Ignore copyright footer     
-        ff3_factors = ff3_factors.iloc[:-2]
-        ff3_factors['Date'] = pd.to_datetime(ff3_factors['Date'],
-                                                    format='%Y%m%d')
+        years, rest = np.divmod(date_codes, 10000)
+        months, days = np.divmod(rest, 100)
+        month_starts = ((years - 1970) * 12 + months - 1).astype('datetime64[M]')
+        dates = month_starts.astype('datetime64[D]') + (days - 1)
+        # Out of range days would otherwise roll into a neighbouring month
+        invalid = ((months < 1) | (months > 12) | (days < 1)
+                   | (dates.astype('datetime64[M]') != month_starts))
+    elif frequency == 'm':
+        years, months = np.divmod(date_codes, 100)
+        # First day of the following month, less one day
+        next_months = ((years - 1970) * 12 + months).astype('datetime64[M]')
+        dates = next_months.astype('datetime64[D]') - 1
+        invalid = (months < 1) | (months > 12)
     else:
-        ff3_raw_data = ff_factor_dict['csv_links'][0]
-        ff3_factors = pd.read_csv(ff3_raw_data, skiprows=rows_to_skip)
-        ff3_factors.rename(columns={ff3_factors.columns[0]: 'Date'},
-                           inplace=True)
-        
-        # Clean annual and monthly versions
+        next_years = (date_codes - 1970 + 1).astype('datetime64[Y]')
+        dates = next_years.astype('datetime64[D]') - 1
+        invalid = np.zeros(len(date_codes), dtype=bool)
+    if invalid.any():
+        raise ValueError('Invalid dates in factor file: {}'.format(
+            ', '.join(str(code) for code in date_codes[invalid][:5])))
+    return dates.astype('datetime64[ns]')
 
-        # Get index of annual factor returns
-        annual_factor_index_loc = ff3_factors[
-            ff3_factors.values == ' Annual Factors: January-December '].index
 
-        if frequency == 'm':
-            ff3_factors.drop(ff3_factors.index[annual_factor_index_loc[0]:], inplace=True)
+def _parse_factor_file(raw_data, dataset=None):
+    '''
+    Parses a zipped Ken French CSV file into a dict of sections by frequency
 
-            # Convert dates to pd datetime objects
-            ff3_factors['Date'] = pd.to_datetime(ff3_factors['Date'],
-                                                            format='%Y%m')
-            # Shift dates to end of month
-            ff3_factors['Date'] = ff3_factors['Date'].apply(
-                lambda date : date + relativedelta(day = 1, months = +1, days = -1))
+    The file is streamed line by line: a line starting with a comma is a
+    column header and opens a new section, lines starting with a digit are
+    data rows, and everything else (notes, section titles such as
+    "Annual Factors: January-December", the copyright footer) is skipped.
+    Each section is then parsed in one pass with explicit dtypes.
+    dataset only labels timing events.
+    '''
+    sections = []
+    with _timed('decompress', dataset=dataset) as event, \
+            zipfile.ZipFile(io.BytesIO(raw_data)) as archive:
+        member_name = archive.namelist()[0]
+        event['bytes'] = archive.getinfo(member_name).file_size
+        with archive.open(member_name) as member:
+            for line in io.TextIOWrapper(member, encoding='latin-1'):
+                line = line.strip()
+                if line.startswith(','):
+                    columns = ['Date'] + [col.strip() for col in line.split(',')[1:]]
+                    rows = []
+                    sections.append((columns, rows))
+                elif line[:1].isdigit() and sections:
+                    rows.append(line)
 
-        elif frequency == 'a':
-            # Extract annual data only
-            ff3_factors.drop(ff3_factors.index[:annual_factor_index_loc[0]],
-                             inplace=True)
+    parsed = {}
+    for columns, rows in sections:
+        if not rows:
+            continue
+        frequency = _date_widths.get(rows[0].index(','))
+        if frequency is None or frequency in parsed:
+            continue
 
-            # Ignore copyright footer & first 2 header rows
-            ff3_factors = ff3_factors.iloc[2:-1]
-            ff3_factors.reset_index(inplace=True)
-            ff3_factors.drop(columns=ff3_factors.columns[0], inplace=True)
+        dtypes = dict.fromkeys(columns[1:], np.float64)
+        dtypes['Date'] = np.int64
+        with _timed('parse', dataset=dataset, frequency=frequency,
+                    rows=len(rows)):
+            section = pd.read_csv(io.StringIO('\n'.join(rows)), header=None,
+                                  names=columns, dtype=dtypes,
+                                  skipinitialspace=True,
+                                  na_values=['-99.99', '-999'])
 
-            # Deal with spacing issues (e.g. '  1927' instead of '1927')
-            ff3_factors['Date'] = ff3_factors['Date'].apply(
-                lambda x : x.strip())
+            # Convert all factors to decimals (%)
+            section[columns[1:]] = section[columns[1:]] / 100
 
-            # Convert dates to datetime objects
-            ff3_factors['Date'] = pd.to_datetime({ff3_factors['Date']}+"1231",
-                                                            format='%Y%m%d')
+        with _timed('dates', dataset=dataset, frequency=frequency,
+                    rows=len(rows)):
+            section['Date'] = _period_end_dates(section['Date'].to_numpy(),
+                                                frequency)
+        parsed[frequency] = section
 
+    return parsed
 
-    # Convert all factors to numeric and decimals (%)
-    for col in ff3_factors.columns[1:]:
-        ff3_factors[col] = pd.to_numeric(ff3_factors[col]) / 100
 
-    return ff3_factors
+def _load_dataset(dataset, frequency):
+    '''
+    Returns a copy of one section of a dataset, parsing its file at most once
+    '''
+    # Hand out copies so callers can never mutate the memo
+    return _memoised_section(dataset, frequency).copy()
+
+
+def _memoised_section(dataset, frequency):
+    '''
+    Returns the memoised DataFrame for one section of a dataset, which
+    must not be modified, downloading and parsing its file if needed
+
+    Every section found in the downloaded file is memoised, so asking for
+    monthly and then annual factors costs a single download and parse.
+    Entries expire with cache_ttl so long-running processes pick up updates.
+    '''
+    key = (dataset, frequency)
+    file_url = _file_url(dataset, frequency)
+    with _parsed_lock:
+        file_lock = _file_locks.setdefault(file_url, threading.Lock())
+
+    with _timed('load', dataset=dataset, frequency=frequency,
+                cache='memory') as event:
+        with file_lock:
+            entry = _parsed.get(key)
+            if entry is None or time.time() - entry[0] >= cache_ttl:
+                event['cache'] = 'miss'
+                spec = _datasets[dataset]
+                sections = _parse_factor_file(_download(file_url), dataset)
+                parsed_at = time.time()
+                for section_frequency, section in sections.items():
+                    section.rename(columns=spec.get('columns', {}), inplace=True)
+                    _parsed[(dataset, section_frequency)] = (parsed_at, section)
+                if frequency not in sections:
+                    raise ValueError(
+                        'No {!r} section found for {} in {}; the file layout '
+                        'may have changed'.format(frequency, dataset, file_url))
+                entry = _parsed[key]
+        event['rows'] = len(entry[1])
+    return entry[1]
+
+
+def _file_url(dataset, frequency):
+    '''
+    Returns the URL of the file holding a dataset at a given frequency
+    '''
+    spec = _datasets[dataset]
+    if frequency not in spec['files']:
+        raise ValueError("frequency must be one of 'd', 'm' or 'a', "
+                         "not {!r}".format(frequency))
+    links = _get_factor_links()[spec['links']]['csv_links']
+    return links[spec['files'][frequency]]
+
+
+def _merge_carhart(ff3_factors, mom_factor):
+    return pd.merge(ff3_factors, mom_factor, on='Date', how='left')
+
+
+def getFactors(models, frequencies='d'):
+    '''
+    Returns several factor models at several frequencies in one call
+
+    models takes any of 'ff3', 'mom', 'carhart4' and 'ff5', and frequencies
+    any of 'd', 'm' and 'a' (a single string or a list of either).
+    The files needed are downloaded concurrently over one pooled HTTP
+    session, each distinct file only once, so the call takes about as long
+    as the slowest download.
+
+    Returns a dict of DataFrames keyed by (model, frequency).
+    '''
+    if isinstance(models, str):
+        models = [models]
+    if isinstance(frequencies, str):
+        frequencies = [frequencies]
+    for model in models:
+        if model not in _models:
+            raise ValueError("model must be one of {}, not {!r}".format(
+                ", ".join(repr(name) for name in _models), model))
+
+    wanted = []
+    for model in models:
+        for frequency in frequencies:
+            for dataset in _models[model]:
+                if (dataset, frequency) not in wanted:
+                    wanted.append((dataset, frequency))
+
+    # Load one section per distinct file; its siblings come from the memo
+    by_file = {}
+    for dataset, frequency in wanted:
+        by_file.setdefault(_file_url(dataset, frequency), (dataset, frequency))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(lambda key: _memoised_section(*key), by_file.values()))
+
+    # Memo frames are only read here; each result below is a new frame
+    loaded = {key : _memoised_section(*key) for key in wanted}
+
+    factors = {}
+    for model in models:
+        for frequency in frequencies:
+            if model == 'carhart4':
+                with _timed('merge', dataset=model,
+                            frequency=frequency) as event:
+                    factors[(model, frequency)] = _merge_carhart(
+                        loaded[('ff3', frequency)], loaded[('mom', frequency)])
+                    event['rows'] = len(factors[(model, frequency)])
+            else:
+                factors[(model, frequency)] = loaded[(model, frequency)].copy()
+    return factors
+
+
+def famaFrench3Factor(frequency='d'):
+    '''
+    Returns Fama French 3 factors (Market Risk Premium, SMB, HML)
+
+    Set frequency as:
+        'd' for daily factors
+        'm' for monthly factors
+        'a' for annual factors
+
+    '''
+    return _load_dataset('ff3', frequency)
 
 
 def momentumFactor(frequency='d'):
@@ -144,151 +699,623 @@ def momentumFactor(frequency='d'):
         'a' for annual factors
 
     '''
-    rows_to_skip = 13
-
-    if frequency == 'd':
-        mom_raw_data = momAndOthers_dict['csv_links'][1]
-        mom_factor = pd.read_csv(mom_raw_data, skiprows=rows_to_skip)
-        mom_factor.rename(columns = {mom_factor.columns[0] : 'Date'},
-                          inplace=True)
-        # Ignore copyright footer
-        mom_factor = mom_factor.iloc[:-2]
-        mom_factor['Date'] = pd.to_datetime(mom_factor['Date'],
-                                                    format='%Y%m%d')
-    else:
-        mom_raw_data = momAndOthers_dict['csv_links'][0]
+    return _load_dataset('mom', frequency)
 
-        mom_factor = pd.read_csv(mom_raw_data, skiprows=rows_to_skip)
-        mom_factor.rename(columns = {mom_factor.columns[0] : 'Date'},
-                          inplace=True)
 
-        # Get index of annual factor returns
-        annual_factor_index_loc = mom_factor[
-                mom_factor.values == 'Annual Factors:'].index
-        # Clean annual and monthly versions
-        if frequency == 'm':
-            # Exclude annual factor returns
-            mom_factor.drop(mom_factor.index[annual_factor_index_loc[0]:], inplace=True)
+def carhart4Factor(frequency='d'):
+    '''
+    Returns Fama French 3 factors (Market Risk Premium, SMB, HML), and Momentum
 
-            # Convert dates to pd datetime objects
-            mom_factor['Date'] = pd.to_datetime(mom_factor['Date'],
-                                                           format='%Y%m')
+    Set frequency as:
+        'd' for daily factors
+        'm' for monthly factors
+        'a' for annual factors
+    '''
+    # Fetches the 3 factor and momentum files concurrently
+    return getFactors('carhart4', frequency)[('carhart4', frequency)]
 
-            # Shift dates to end of month
-            mom_factor['Date'] = mom_factor['Date'].apply(
-                lambda date : date + relativedelta(day = 1, months = +1, days = -1))
 
-        elif frequency == 'a':
-            # Extract annual data only
-            mom_factor.drop(mom_factor.index[:annual_factor_index_loc[0]],
-                            inplace=True)
+def famaFrench5Factor(frequency='d'):
+    '''
+    Returns Fama French 5 factors (Market Risk Premium, SMB, HML, RMW, CMA),
+    and the risk-free rate (RF)
+    '''
+    return _load_dataset('ff5', frequency)
 
-            # Ignore copyright footer & first 2 header rows
-            mom_factor = mom_factor.iloc[3:-1]
-            mom_factor.reset_index(inplace=True)
-            mom_factor.drop(columns=mom_factor.columns[0], inplace=True)
 
-            # Deal with spacing issues (e.g. '  1927' instead of '1927')
-            mom_factor['Date'] = mom_factor['Date'].apply(
-                lambda x : x.strip())
+# Months per period and weekday numbers for resampleFactors()
+_period_months = {'m' : 1, 'q' : 3, 'a' : 12}
+_weekdays = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
 
-        # Convert dates to datetime objects
-        mom_factor['Date'] = pd.to_datetime(mom_factor['Date']+"1231",
-                                                       format='%Y%m%d')
 
-    # Convert all factors to numeric and decimals (%)
-    for col in mom_factor.columns[1:]:
-        mom_factor[col] = pd.to_numeric(mom_factor[col]) / 100
+def _period_ends(dates, frequency, fiscal_year_end=12, week_end='FRI'):
+    '''
+    Returns the last calendar day of the period each date falls in
+    '''
+    days = dates.astype('datetime64[D]')
+    if frequency == 'w':
+        if week_end not in _weekdays:
+            raise ValueError("week_end must be one of {}, not {!r}".format(
+                ", ".join(_weekdays), week_end))
+        # 1970-01-01 was a Thursday
+        weekdays = (days.astype(np.int64) + 3) % 7
+        return days + (_weekdays.index(week_end) - weekdays) % 7
 
-    # Rename momentum factor to eliminate white space
-    mom_factor.rename(columns={mom_factor.columns[1] : 'MOM'}, inplace=True)
+    if frequency not in _period_months:
+        raise ValueError("frequency must be one of 'w', 'm', 'q' or 'a', "
+                         "not {!r}".format(frequency))
+    if fiscal_year_end not in range(1, 13):
+        raise ValueError("fiscal_year_end must be a month number from 1 to 12")
 
-    return mom_factor
+    # Count months from the epoch and roll forward to the period's last month
+    months = days.astype('datetime64[M]').astype(np.int64)
+    step = _period_months[frequency]
+    end_months = months + (fiscal_year_end - 1 - months) % step
+    return (end_months + 1).astype('datetime64[M]').astype('datetime64[D]') - 1
 
 
-def carhart4Factor(frequency='d'):
+def resampleFactors(factors, frequency='m', fiscal_year_end=12, week_end='FRI'):
     '''
-    Returns Fama French 3 factors (Market Risk Premium, SMB, HML), and Momentum
+    Compounds daily factor returns into returns over longer periods
+
+    factors is a DataFrame of daily returns with a "Date" column, such as
+    the output of famaFrench3Factor('d'). Returns are compounded
+    geometrically, (1 + r) multiplied across each period, less one. When
+    RF is present, Mkt-RF is rebuilt as the compounded market return less
+    the compounded RF, as in the official files.
 
     Set frequency as:
-        'd' for daily factors
+        'w' for weekly factors, with weeks ending on week_end ('MON'-'SUN')
         'm' for monthly factors
+        'q' for quarterly factors
         'a' for annual factors
+
+    Quarters and years end in the month fiscal_year_end (12 is calendar
+    years, 6 is years ending in June). Each period is dated by its last
+    calendar day, like the official monthly and annual files, and the first
+    and last periods may only be partly covered by the daily data. A period
+    with any missing (NaN) daily return is NaN for that factor.
     '''
-    if frequency == 'd':
-        ff3_factors = famaFrench3Factor(frequency='d')
-        mom_factor = momentumFactor(frequency='d')
+    dates = factors['Date'].to_numpy(dtype='datetime64[ns]')
+    period_ends = _period_ends(dates, frequency, fiscal_year_end, week_end)
 
-    elif frequency == 'm':
-        ff3_factors = famaFrench3Factor(frequency='m')
-        mom_factor = momentumFactor(frequency='m')
+    # Sum log growth per period, which compounds without any per-group calls
+    columns = [col for col in factors.columns if col != 'Date']
+    returns = factors[columns].to_numpy(dtype=np.float64, copy=True)
+    excess_market = 'Mkt-RF' in columns and 'RF' in columns
+    if excess_market:
+        # Compound the market itself; the excess is taken per period below
+        market, rf = columns.index('Mkt-RF'), columns.index('RF')
+        returns[:, market] += returns[:, rf]
 
-    elif frequency == 'a':
-        ff3_factors = famaFrench3Factor(frequency='a')
-        mom_factor = momentumFactor(frequency='a')
+    log_growth = pd.DataFrame(np.log1p(returns), columns=columns)
+    grouped = log_growth.groupby(period_ends.astype('datetime64[ns]'), sort=True)
+    # A day missing from a period leaves its return unknown, not zero
+    incomplete = grouped.count().lt(grouped.size(), axis=0)
+    compounded = grouped.sum().mask(incomplete)
 
-    carhart_4_factor = pd.merge(ff3_factors, mom_factor,
-                                    on='Date', how='left')
-    return carhart_4_factor
+    resampled = np.expm1(compounded)
+    if excess_market:
+        resampled['Mkt-RF'] -= resampled['RF']
+    resampled.index.name = 'Date'
+    return resampled.reset_index()
 
 
-def famaFrench5Factor(frequency='d'):
+def deriveFactors(model, frequency='m', fiscal_year_end=12, week_end='FRI',
+                  reconcile=False):
     '''
-    Returns Fama French 5 factors (Market Risk Premium, SMB, HML, RMW, CMA),
-    and the risk-free rate (RF)
+    Returns factors for model ('ff3', 'mom', 'carhart4' or 'ff5') derived
+    from its daily file with resampleFactors()
+
+    This gives frequencies the library does not publish, such as weekly,
+    quarterly or fiscal-year factors, from a single daily download.
+
+    With reconcile=True the official monthly ('m') or annual ('a') file is
+    loaded too and a tuple (factors, deviations) is returned, deviations
+    being the largest absolute difference per column over shared dates.
     '''
-    rows_to_skip = 3
+    if reconcile and (frequency not in ('m', 'a') or fiscal_year_end != 12):
+        raise ValueError("reconcile needs frequency 'm' or 'a' with "
+                         "fiscal_year_end=12, as published in the library")
 
-    if frequency == 'd':
-        ff5_raw_data = ff_factor_dict['csv_links'][4]
-        ff5_factors = pd.read_csv(ff5_raw_data, skiprows=rows_to_skip)
-        ff5_factors.rename(columns={ff5_factors.columns[0]: 'Date'},
-                           inplace=True)
-        # Ignore copyright footer     
-        ff5_factors = ff5_factors.iloc[:-2]
-        ff5_factors['Date'] = pd.to_datetime(ff5_factors['Date'],
-                                                    format='%Y%m%d')
+    frequencies = ['d', frequency] if reconcile else ['d']
+    loaded = getFactors(model, frequencies)
+    derived = resampleFactors(loaded[(model, 'd')], frequency,
+                              fiscal_year_end, week_end)
+    if not reconcile:
+        return derived
+
+    official = loaded[(model, frequency)]
+    shared = pd.merge(derived, official, on='Date', suffixes=('', '_official'))
+    columns = [col for col in derived.columns if col != 'Date']
+    deviations = pd.Series(
+        {col : (shared[col] - shared[col + '_official']).abs().max()
+         for col in columns})
+    return derived, deviations
+
+
+def _store_path(model, frequency, store_dir):
+    if store_dir is None:
+        store_dir = os.path.join(cache_dir, 'store')
+    return os.path.join(store_dir, '{}_{}'.format(model, frequency))
+
+
+def readFactorStore(model, frequency='d', since=None, store_dir=None):
+    '''
+    Returns the factors kept in the local store by refreshFactors()
+
+    The store holds one Parquet file per calendar year. Pass since (a date)
+    to read only the rows from that date on, opening only the files that
+    can hold them. store_dir defaults to cache_dir/store.
+    '''
+    path = _store_path(model, frequency, store_dir)
+    since = None if since is None else pd.Timestamp(since)
+
+    partitions = []
+    if os.path.isdir(path):
+        for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+            year, extension = os.path.splitext(entry.name)
+            if extension != '.parquet':
+                continue
+            if since is not None and int(year) < since.year:
+                continue
+            partitions.append(pd.read_parquet(entry.path))
+    if not partitions:
+        return pd.DataFrame(columns=['Date'])
+
+    stored = pd.concat(partitions, ignore_index=True)
+    stored['Date'] = stored['Date'].astype('datetime64[ns]')
+    if since is not None:
+        stored = stored[stored['Date'] >= since].reset_index(drop=True)
+    return stored
+
+
+def refreshFactors(model, frequency='d', store_dir=None):
+    '''
+    Updates the local Parquet store for model at frequency and returns
+    what changed
+
+    The latest file is compared with the stored history: rows after the
+    last stored date are appended, and values French has revised since the
+    last refresh are detected and reported. Only the yearly files that hold
+    new or revised rows are rewritten, so unchanged history stays on disk
+    as it was. Needs a Parquet engine such as pyarrow.
+
+    Returns a dict with:
+        'appended' -- DataFrame of rows dated after the stored history
+        'revised' -- DataFrame of revised values (Date, Factor, Stored, New)
+        'added_columns' -- factors in the file but not in the store
+        'dropped_columns' -- factors in the store but no longer in the file
+        'years' -- list of the yearly files that were written
+    '''
+    path = _store_path(model, frequency, store_dir)
+    latest = getFactors(model, frequency)[(model, frequency)]
+    stored = readFactorStore(model, frequency, store_dir=store_dir)
+    columns = [col for col in latest.columns if col != 'Date']
+    no_revisions = pd.DataFrame({'Date' : pd.Series(dtype='datetime64[ns]'),
+                                 'Factor' : pd.Series(dtype=object),
+                                 'Stored' : pd.Series(dtype=np.float64),
+                                 'New' : pd.Series(dtype=np.float64)})
+
+    if stored.empty:
+        appended = latest
+        revised = no_revisions
+        added_columns, dropped_columns = [], []
+        changed_years = set(latest['Date'].dt.year)
     else:
-        ff5_raw_data = ff_factor_dict['csv_links'][3]
-        ff5_factors = pd.read_csv(ff5_raw_data, skiprows=rows_to_skip)
-        ff5_factors.rename(columns = {ff5_factors.columns[0] : 'Date'},
-                           inplace=True)
-
-        # Get index of annual factor returns
-        annual_factor_index_loc = ff5_factors[
-                ff5_factors.values == ' Annual Factors: January-December '].index
-
-        # Clean annual and monthly versions
-        if frequency == 'm':
-            ff5_factors.drop(ff5_factors.index[annual_factor_index_loc[0]:], inplace=True)
-
-            # Convert dates to pd datetime objects
-            ff5_factors['Date'] = pd.to_datetime(ff5_factors['Date'],
-                                                            format='%Y%m')
-            # Shift dates to end of month
-            ff5_factors['Date'] = ff5_factors['Date'].apply(
-                lambda date : date + relativedelta(day = 1, months = +1, days = -1))
-
-        elif frequency == 'a':
-            # Extract annual data only
-            ff5_factors.drop(ff5_factors.index[:annual_factor_index_loc[0]],
-                             inplace=True)
-
-            # Ignore copyright footer & first 2 header rows
-            ff5_factors = ff5_factors.iloc[2:]
-            ff5_factors.reset_index(inplace=True)
-            ff5_factors.drop(columns=ff5_factors.columns[0], inplace=True)
-
-            # Deal with spacing issues (e.g. '  1927' instead of '1927')
-            ff5_factors['Date'] = ff5_factors['Date'].apply(
-                lambda x : x.strip())
-
-            # Convert dates to datetime objects (note: values will be int64)
-            ff5_factors['Date'] = pd.to_datetime(ff5_factors['Date']+"1231",
-                                                            format='%Y%m%d')
-
-    # Convert all factors to numeric and decimals (%)
-    for col in ff5_factors.columns[1:]:
-        ff5_factors[col] = pd.to_numeric(ff5_factors[col]) / 100
-
-    return ff5_factors
+        appended = latest[latest['Date'] > stored['Date'].max()]
+        aligned = pd.merge(stored, latest, on='Date', how='outer',
+                           suffixes=('_stored', ''), indicator=True)
+        history = aligned[aligned['Date'] <= stored['Date'].max()]
+
+        revisions = []
+        for col in columns:
+            if col + '_stored' not in history.columns:
+                continue  # Columns new to the file are written below
+            old = history[col + '_stored'].to_numpy()
+            new = history[col].to_numpy()
+            changed = ~np.isclose(old, new, rtol=0, atol=1e-12, equal_nan=True)
+            revisions.append(pd.DataFrame({'Date' : history['Date'][changed],
+                                           'Factor' : col,
+                                           'Stored' : old[changed],
+                                           'New' : new[changed]}))
+        revised = pd.concat([no_revisions] + revisions, ignore_index=True)
+        revised = revised.sort_values(['Date', 'Factor'], ignore_index=True)
+
+        stored_columns = [col for col in stored.columns if col != 'Date']
+        added_columns = [col for col in columns if col not in stored_columns]
+        dropped_columns = [col for col in stored_columns if col not in columns]
+
+        # Rows added or dropped within the stored history count as revisions
+        # of their year, as does any change in the columns of the file
+        changed_years = set(revised['Date'].dt.year)
+        changed_years |= set(history.loc[history['_merge'] != 'both', 'Date'].dt.year)
+        changed_years |= set(appended['Date'].dt.year)
+        if added_columns or dropped_columns:
+            changed_years |= set(latest['Date'].dt.year)
+
+    os.makedirs(path, exist_ok=True)
+    latest_years = latest['Date'].dt.year
+    for year in sorted(changed_years):
+        partition_path = os.path.join(path, '{}.parquet'.format(year))
+        partition = latest[latest_years == year]
+        if partition.empty:
+            os.remove(partition_path)
+            continue
+        tmp_path = '{}.{}.tmp'.format(partition_path, os.getpid())
+        partition.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, partition_path)
+
+    return {'appended' : appended.reset_index(drop=True),
+            'revised' : revised,
+            'added_columns' : added_columns,
+            'dropped_columns' : dropped_columns,
+            'years' : sorted(int(year) for year in changed_years)}
+
+
+def publishFactorPanel(path=None, models=None, frequencies='d', float32=False):
+    '''
+    Loads factor models once and publishes them as a read-only panel of
+    memory-mapped arrays that other processes attach to with
+    attachFactorPanel()
+
+    models defaults to 'ff3', 'mom' and 'ff5'. carhart4 is only the 3
+    factors plus MOM, so it is left out to avoid storing those columns
+    twice; add it when workers need it as a single frame. Each model and
+    frequency is stored as a dates array plus one
+    contiguous array per factor, in float32 if set to halve the size.
+    path defaults to a new directory in /dev/shm where available, so the
+    panel lives in shared memory. Remove the directory when done.
+
+    Returns path.
+    '''
+    if models is None:
+        models = [model for model in _models if model != 'carhart4']
+    if isinstance(frequencies, str):
+        frequencies = [frequencies]
+    if path is None:
+        shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        path = tempfile.mkdtemp(prefix='getFamaFrenchFactors_', dir=shm_dir)
+    os.makedirs(path, exist_ok=True)
+    dtype = np.float32 if float32 else np.float64
+
+    def save(file_name, array):
+        tmp_path = os.path.join(path, file_name + '.tmp')
+        with open(tmp_path, 'wb') as fh:
+            np.save(fh, array)
+        os.replace(tmp_path, os.path.join(path, file_name))
+
+    panels = []
+    for (model, frequency), factors in getFactors(models, frequencies).items():
+        name = '{}_{}'.format(model, frequency)
+        columns = [col for col in factors.columns if col != 'Date']
+        save(name + '_dates.npy', factors['Date'].to_numpy(dtype='datetime64[ns]'))
+        # Stored factor by factor, each row one contiguous column
+        save(name + '_values.npy',
+             np.ascontiguousarray(factors[columns].to_numpy(dtype=dtype).T))
+        panels.append({'model' : model, 'frequency' : frequency,
+                       'columns' : columns, 'name' : name})
+
+    # Written last, so attaching never sees a half published panel
+    _write_atomic(os.path.join(path, 'manifest.json'),
+                  json.dumps({'panels' : panels}).encode('utf-8'))
+    return path
+
+
+def attachFactorPanel(path):
+    '''
+    Attaches to a panel written by publishFactorPanel()
+
+    Returns a dict of DataFrames keyed by (model, frequency), as from
+    getFactors(). The frames are read-only views over the memory-mapped
+    arrays: nothing is downloaded, parsed or copied, and every process
+    attached to the panel shares the same memory.
+    '''
+    manifest = _read_json(os.path.join(path, 'manifest.json'))
+    if manifest is None:
+        raise FileNotFoundError('No factor panel published in {}'.format(path))
+
+    factors = {}
+    for panel in manifest['panels']:
+        dates = np.load(os.path.join(path, panel['name'] + '_dates.npy'),
+                        mmap_mode='r')
+        values = np.load(os.path.join(path, panel['name'] + '_values.npy'),
+                         mmap_mode='r')
+        # The transpose keeps each factor contiguous, so pandas need not copy
+        frame = pd.DataFrame(values.T, columns=panel['columns'], copy=False)
+        frame.insert(0, 'Date', pd.Series(dates, copy=False))
+        factors[(panel['model'], panel['frequency'])] = frame
+    return factors
+
+
+def _align_returns(returns, factors, subtract_rf):
+    '''
+    Aligns asset returns to factor dates and returns (dates, X, Y, names)
+
+    X holds the factors with RF dropped, Y the asset returns less RF when
+    subtract_rf is set. Dates without a complete set of factors are
+    dropped; missing asset returns are kept as NaN.
+    '''
+    if 'Date' in returns.columns:
+        returns = returns.set_index('Date')
+    returns = returns.set_axis(
+        pd.DatetimeIndex(returns.index).astype('datetime64[ns]'), axis=0)
+
+    factors = factors.dropna().set_index('Date')
+    factors.index = factors.index.astype('datetime64[ns]')
+    factor_names = [col for col in factors.columns if col != 'RF']
+
+    dates = returns.index.intersection(factors.index).sort_values()
+    X = factors.loc[dates, factor_names].to_numpy(dtype=np.float64)
+    # Y is always a fresh array that callers may modify in place
+    Y = returns.loc[dates].to_numpy(dtype=np.float64, copy=not subtract_rf)
+    if subtract_rf:
+        if 'RF' not in factors.columns:
+            raise ValueError("factors has no 'RF' column to subtract; "
+                             "pass subtract_rf=False for excess returns")
+        Y = Y - factors.loc[dates, ['RF']].to_numpy(dtype=np.float64)
+    return dates, X, Y, factor_names
+
+
+def _cross_products(left, right, weights):
+    '''
+    Returns sum_t weights[t, n] * left[t, i] * right[t, j] for every asset
+    n as an (assets, i, j) array, using a single matrix product
+    '''
+    outer = (left[:, :, None] * right[:, None, :]).reshape(len(left), -1)
+    products = outer.T @ weights
+    return products.T.reshape(weights.shape[1], left.shape[1], right.shape[1])
+
+
+def _diagonal_scale(xtx):
+    '''
+    Returns the factors that scale one or a stack of X'X matrices to a
+    unit diagonal, zero for a parameter that was never observed
+
+    Solving the scaled normal equations keeps the constant column from
+    swamping factor returns that are orders of magnitude smaller, so as
+    little precision as possible is lost.
+    '''
+    diagonal = np.diagonal(xtx, axis1=-2, axis2=-1)
+    with np.errstate(divide='ignore'):
+        return np.where(diagonal > 0, 1 / np.sqrt(diagonal), 0.0)
+
+
+def _scaled_pinv(xtx):
+    '''
+    Returns the pseudo-inverse of one or a stack of X'X matrices, computed
+    on the matrices scaled to a unit diagonal
+    '''
+    scale = _diagonal_scale(xtx)
+    outer = scale[..., :, None] * scale[..., None, :]
+    return np.linalg.pinv(xtx * outer) * outer
+
+
+def factorRegression(returns, factors, subtract_rf=True, newey_west_lags=None):
+    '''
+    Regresses many asset returns on a set of factors at once
+
+    returns is a wide DataFrame of asset returns (one column per asset)
+    indexed by date or with a "Date" column, in decimals and dated like the
+    factors (last day of the period for monthly and annual data). factors
+    is the output of a loader such as carhart4Factor('m').
+
+    Each asset is regressed on a constant and every factor but RF, which is
+    subtracted from the asset returns unless subtract_rf is False. Assets
+    may have missing returns: each uses only its own observed dates, and
+    all assets are solved together with batched least squares instead of a
+    loop over columns. Set newey_west_lags to use Newey-West (Bartlett)
+    standard errors for the t-stats instead of the usual OLS ones; lags are
+    counted in factor periods, missing returns contributing nothing.
+
+    Returns a dict of arrays:
+        'alpha' -- (assets,) intercepts
+        'beta' -- (assets, factors) factor loadings
+        'alpha_tstat', 'beta_tstat' -- t-stats of the above
+        'r2' -- (assets,) R squared
+        'nobs' -- (assets,) number of observations used
+        'assets', 'factors' -- labels for the two axes
+    '''
+    dates, X, Y, factor_names = _align_returns(returns, factors, subtract_rf)
+    X = np.column_stack([np.ones(len(dates)), X])
+    n_params = X.shape[1]
+
+    # Missing returns get zero weight; Y is a private copy, so fill in place
+    observed = ~np.isnan(Y)
+    weights = observed.astype(np.float64)
+    Y_filled = Y
+    np.copyto(Y_filled, 0.0, where=~observed)
+    nobs = observed.sum(axis=0)
+
+    # Per-asset normal equations; pinv copes with too few or collinear rows
+    XtX = _cross_products(X, X, weights)
+    Xty = (X.T @ Y_filled).T
+    XtX_inv = _scaled_pinv(XtX)
+    params = np.einsum('nij,nj->ni', XtX_inv, Xty)
+
+    # Sums of squares from the normal equations, without a residual matrix
+    yty = np.einsum('tn,tn->n', Y_filled, Y_filled)
+    ssr = (yty - 2 * np.einsum('ni,ni->n', params, Xty)
+           + np.einsum('ni,nij,nj->n', params, XtX, params))
+    ssr = np.maximum(ssr, 0.0)
+    dof = nobs - n_params
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if newey_west_lags is None:
+            variances = (ssr / dof)[:, None] * np.diagonal(XtX_inv, axis1=1, axis2=2)
+        else:
+            # Sandwich estimator with Bartlett weighted autocovariances
+            residuals = X @ params.T
+            np.subtract(Y_filled, residuals, out=residuals)
+            residuals *= weights
+            meat = _cross_products(X, X, residuals ** 2)
+            for lag in range(1, newey_west_lags + 1):
+                gamma = _cross_products(X[lag:], X[:-lag],
+                                        residuals[lag:] * residuals[:-lag])
+                weight = 1 - lag / (newey_west_lags + 1)
+                meat += weight * (gamma + gamma.transpose(0, 2, 1))
+            covariance = XtX_inv @ meat @ XtX_inv
+            variances = np.diagonal(covariance, axis1=1, axis2=2)
+        tstats = params / np.sqrt(variances)
+
+        sst = yty - Y_filled.sum(axis=0) ** 2 / nobs
+        r2 = 1 - ssr / sst
+
+    # Too few observations to estimate anything
+    underdetermined = dof <= 0
+    params[underdetermined] = np.nan
+    tstats[underdetermined] = np.nan
+    r2[underdetermined] = np.nan
+
+    assets = returns.columns.drop('Date', errors='ignore')
+    return {'alpha' : params[:, 0],
+            'beta' : params[:, 1:],
+            'alpha_tstat' : tstats[:, 0],
+            'beta_tstat' : tstats[:, 1:],
+            'r2' : r2,
+            'nobs' : nobs,
+            'assets' : np.asarray(assets),
+            'factors' : np.asarray(factor_names)}
+
+
+class RollingFactorRegression:
+    '''
+    Rolling or expanding window factor regressions for many assets,
+    updated one period at a time
+
+    Running sums of X'X and X'y are kept for every asset: each update adds
+    the new period and, for a rolling window, subtracts the period that
+    leaves it, so a step costs the same however long the window is. Assets
+    observed on every date of the window share one X'X and are solved with
+    a single inverse; only assets with gaps are solved individually.
+
+    Set window to the number of periods, or to None for an expanding
+    window. Betas are only reported once an asset has min_periods
+    observations in the window (by default the whole window, or the number
+    of parameters for an expanding window); a window too short for that,
+    or for the factors plus a constant, raises ValueError. Instances can be pickled, so a
+    stream can be resumed when new factor data arrives.
+    '''
+
+    def __init__(self, n_assets, n_factors, window=None, min_periods=None):
+        self.n_assets = n_assets
+        self.n_factors = n_factors
+        self.window = window
+        n_params = n_factors + 1
+        if min_periods is None:
+            min_periods = window if window is not None else n_params
+        self.min_periods = max(min_periods, n_params)
+        if window is not None and self.min_periods > window:
+            raise ValueError(
+                'window={} is shorter than min_periods={} (at least {}, the '
+                'factors and a constant)'.format(window, self.min_periods, n_params))
+
+        self._xtx_all = np.zeros((n_params, n_params))
+        self._xtx = np.zeros((n_assets, n_params, n_params))
+        self._xty = np.zeros((n_assets, n_params))
+        self._nobs = np.zeros(n_assets, dtype=np.int64)
+        self._periods = 0
+        self._rows = collections.deque()
+
+    def _add(self, x, y, observed, sign):
+        xx = np.outer(x, x)
+        self._xtx_all += sign * xx
+        self._xtx[observed] += sign * xx
+        self._xty += sign * (y[:, None] * x)
+        self._nobs += sign * observed
+        self._periods += sign
+
+    def update(self, factor_values, asset_returns):
+        '''
+        Adds one period and returns the regressions for the window ending
+        there, as a dict of 'alpha' (assets,), 'beta' (assets, factors) and
+        'nobs' (assets,)
+
+        factor_values holds the period's factors (excluding RF) and
+        asset_returns the assets' excess returns, NaN where missing. A
+        period with a missing factor counts as missing for every asset.
+        '''
+        x = np.concatenate(([1.0], np.asarray(factor_values, dtype=np.float64)))
+        y = np.asarray(asset_returns, dtype=np.float64)
+        observed = ~np.isnan(y)
+        if np.isnan(x).any():
+            x = np.zeros_like(x)
+            observed[:] = False
+        y = np.where(observed, y, 0.0)
+
+        self._add(x, y, observed, 1)
+        # Only a rolling window needs the rows back when they leave it
+        if self.window is not None:
+            self._rows.append((x, y, observed))
+            if len(self._rows) > self.window:
+                self._add(*self._rows.popleft(), -1)
+
+        return self._solve()
+
+    def _solve(self):
+        params = np.full((self.n_assets, self.n_factors + 1), np.nan)
+        ready = self._nobs >= self.min_periods
+
+        # Fully observed assets all share the same X'X
+        complete = ready & (self._nobs == self._periods)
+        if complete.any():
+            xtx_inv = _scaled_pinv(self._xtx_all)
+            params[complete] = self._xty[complete] @ xtx_inv
+
+        gaps = ready & ~complete
+        if gaps.any():
+            xtx = self._xtx[gaps]
+            scale = _diagonal_scale(xtx)
+            scaled = xtx * scale[:, :, None] * scale[:, None, :]
+            xty = (self._xty[gaps] * scale)[:, :, None]
+            try:
+                params[gaps] = np.linalg.solve(scaled, xty)[:, :, 0] * scale
+            except np.linalg.LinAlgError:
+                params[gaps] = (np.linalg.pinv(scaled) @ xty)[:, :, 0] * scale
+
+        return {'alpha' : params[:, 0],
+                'beta' : params[:, 1:],
+                'nobs' : self._nobs.copy()}
+
+
+def rollingFactorBetas(returns, factors, window=36, min_periods=None,
+                       subtract_rf=True):
+    '''
+    Returns rolling window factor regressions for many assets at every date
+
+    Inputs are as for factorRegression(). window is the number of periods
+    in each regression (e.g. 36 for monthly or 252 for daily data), or
+    None for expanding windows; see RollingFactorRegression for
+    min_periods.
+
+    Returns a dict of:
+        'alpha' -- (dates, assets) intercepts
+        'beta' -- (dates, assets, factors) factor loadings
+        'nobs' -- (dates, assets) observations in each window
+        'dates', 'assets', 'factors' -- labels for the axes
+        'model' -- the RollingFactorRegression after the last date; call
+                   its update() with each new period to extend the series
+                   without recomputing history
+    '''
+    dates, X, Y, factor_names = _align_returns(returns, factors, subtract_rf)
+    n_dates, n_assets = Y.shape
+    model = RollingFactorRegression(n_assets, len(factor_names), window,
+                                    min_periods)
+
+    alpha = np.empty((n_dates, n_assets))
+    beta = np.empty((n_dates, n_assets, len(factor_names)))
+    nobs = np.empty((n_dates, n_assets), dtype=np.int64)
+    for step in range(n_dates):
+        fitted = model.update(X[step], Y[step])
+        alpha[step] = fitted['alpha']
+        beta[step] = fitted['beta']
+        nobs[step] = fitted['nobs']
+
+    assets = returns.columns.drop('Date', errors='ignore')
+    return {'alpha' : alpha,
+            'beta' : beta,
+            'nobs' : nobs,
+            'dates' : np.asarray(dates),
+            'assets' : np.asarray(assets),
+            'factors' : np.asarray(factor_names),
+            'model' : model}
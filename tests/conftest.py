@@ -0,0 +1,62 @@
+import io
+import os
+import sys
+import time
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import getFamaFrenchFactors as gff  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def read_fixture(name):
+    with open(os.path.join(DATA_DIR, name), 'rb') as fh:
+        return fh.read()
+
+
+def edit_fixture(name, *replacements):
+    '''
+    Returns the zipped fixture name with each (old, new) text replaced in
+    its CSV file, as French would publish a revised file
+    '''
+    with zipfile.ZipFile(io.BytesIO(read_fixture(name))) as archive:
+        member = archive.namelist()[0]
+        text = archive.read(member).decode('utf-8')
+    for old, new in replacements:
+        assert old in text
+        text = text.replace(old, new)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(member, text)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def offline_library(monkeypatch, tmp_path):
+    '''
+    Points the loaders at the zipped CSV files in tests/data, without
+    scraping or downloading anything
+
+    Yields the served files by name, so tests can publish new versions.
+    '''
+    def links(*names):
+        return {'csv_links' : ['fixture:' + name for name in names],
+                'txt_links' : []}
+
+    files = {name : read_fixture(name) for name in os.listdir(DATA_DIR)}
+    manifest = {'ff' : links('F-F_Research_Data_Factors_CSV.zip', 'missing',
+                             'F-F_Research_Data_Factors_daily_CSV.zip',
+                             'F-F_Research_Data_5_Factors_2x3_CSV.zip'),
+                'mom' : links('F-F_Momentum_Factor_CSV.zip',
+                              'F-F_Momentum_Factor_daily_CSV.zip'),
+                'scraped_at' : time.time()}
+    monkeypatch.setattr(gff, 'cache_dir', str(tmp_path))
+    monkeypatch.setattr(gff, '_factor_links', manifest)
+    monkeypatch.setattr(gff, '_download',
+                        lambda file_url: files[file_url[len('fixture:'):]])
+    gff._parsed.clear()
+    yield files
+    gff._parsed.clear()
@@ -0,0 +1,161 @@
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+from conftest import DATA_DIR, gff
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from fixture_server import serve  # noqa: E402
+
+MONTHLY = 'F-F_Research_Data_Factors_CSV.zip'
+DAILY = 'F-F_Research_Data_Factors_daily_CSV.zip'
+MOMENTUM = 'F-F_Momentum_Factor_daily_CSV.zip'
+
+
+@pytest.fixture
+def site(monkeypatch, tmp_path):
+    '''
+    Serves copies of the sample files from a local server, with an empty
+    cache, and yields (base URL, served directory)
+    '''
+    site_dir = tmp_path / 'site'
+    shutil.copytree(DATA_DIR, str(site_dir))
+    monkeypatch.setattr(gff, 'cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.setattr(gff, 'request_retries', 0)
+    monkeypatch.setattr(gff, '_session', None)
+    with serve(str(site_dir)) as base_url:
+        yield base_url, site_dir
+
+
+def download(url):
+    '''
+    Returns the downloaded bytes and the 'download' event
+    '''
+    with gff.profileLoads() as events:
+        data = gff._download(url)
+    assert [event['phase'] for event in events] == ['download']
+    return data, events[0]
+
+
+def served(site_dir, name):
+    with open(str(site_dir / name), 'rb') as fh:
+        return fh.read()
+
+
+def test_fresh_copy_is_served_from_disk(site):
+    base_url, site_dir = site
+    data, event = download(base_url + MONTHLY)
+    assert data == served(site_dir, MONTHLY)
+    assert event['cache'] == 'miss'
+    assert event['bytes'] == len(data)
+
+    data, event = download(base_url + MONTHLY)
+    assert data == served(site_dir, MONTHLY)
+    assert event['cache'] == 'hit'
+    assert event['bytes'] == 0
+
+
+def test_expired_copy_is_revalidated(site, monkeypatch):
+    base_url, site_dir = site
+    download(base_url + MONTHLY)
+    monkeypatch.setattr(gff, 'cache_ttl', 0)
+
+    data, event = download(base_url + MONTHLY)
+    assert data == served(site_dir, MONTHLY)
+    assert event['cache'] == 'revalidated'
+    assert event['bytes'] == 0
+
+
+def test_updated_file_is_downloaded_again(site, monkeypatch):
+    base_url, site_dir = site
+    download(base_url + MONTHLY)
+    monkeypatch.setattr(gff, 'cache_ttl', 0)
+    shutil.copy(str(site_dir / DAILY), str(site_dir / MONTHLY))
+    later = time.time() + 60
+    os.utime(str(site_dir / MONTHLY), (later, later))
+
+    data, event = download(base_url + MONTHLY)
+    assert data == served(site_dir, DAILY)
+    assert event['cache'] == 'miss'
+
+
+def test_offline_uses_only_the_cache(site, monkeypatch):
+    base_url, site_dir = site
+    download(base_url + MONTHLY)
+    monkeypatch.setattr(gff, 'offline', True)
+    monkeypatch.setattr(gff, 'cache_ttl', 0)
+
+    data, event = download(base_url + MONTHLY)
+    assert data == served(site_dir, MONTHLY)
+    assert event['cache'] == 'hit'
+    with pytest.raises(FileNotFoundError):
+        gff._download(base_url + DAILY)
+
+
+def test_least_recently_used_files_are_evicted(site, monkeypatch):
+    base_url, site_dir = site
+    sizes = {name : len(served(site_dir, name)) for name in (MONTHLY, DAILY, MOMENTUM)}
+    monkeypatch.setattr(gff, 'cache_max_bytes', sum(sizes.values()) - 1)
+
+    download(base_url + MONTHLY)
+    download(base_url + DAILY)
+    time.sleep(0.01)
+    download(base_url + MONTHLY)  # Now used more recently than DAILY
+    time.sleep(0.01)
+    download(base_url + MOMENTUM)
+
+    assert download(base_url + MONTHLY)[1]['cache'] == 'hit'
+    assert download(base_url + MOMENTUM)[1]['cache'] == 'hit'
+    assert download(base_url + DAILY)[1]['cache'] == 'miss'
+
+
+def test_stale_copy_is_used_when_site_is_down(monkeypatch, tmp_path):
+    monkeypatch.setattr(gff, 'cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.setattr(gff, 'request_retries', 0)
+    monkeypatch.setattr(gff, '_session', None)
+    with serve(DATA_DIR) as base_url:
+        expected, _ = download(base_url + MONTHLY)
+    monkeypatch.setattr(gff, 'cache_ttl', 0)
+
+    data, event = download(base_url + MONTHLY)
+    assert data == expected
+    assert event['cache'] == 'stale'
+    assert 'error' not in event
+
+
+def test_read_only_cache_still_serves_hits_and_304s(site, monkeypatch):
+    base_url, site_dir = site
+    download(base_url + MONTHLY)
+
+    def refuse(*args, **kwargs):
+        raise PermissionError('read-only cache')
+
+    monkeypatch.setattr(os, 'utime', refuse)
+    monkeypatch.setattr(gff, '_write_atomic', refuse)
+    data, event = download(base_url + MONTHLY)
+    assert data == served(site_dir, MONTHLY)
+    assert event['cache'] == 'hit'
+
+    monkeypatch.setattr(gff, 'cache_ttl', 0)
+    data, event = download(base_url + MONTHLY)
+    assert data == served(site_dir, MONTHLY)
+    assert event['cache'] == 'revalidated'
+
+
+def test_session_follows_http_settings(monkeypatch):
+    monkeypatch.setattr(gff, '_session', None)
+    session = gff._get_session()
+    assert gff._get_session() is session
+
+    monkeypatch.setattr(gff, 'request_retries', 7)
+    retried = gff._get_session()
+    assert retried is not session
+    assert retried.get_adapter('https://example.com').max_retries.total == 7
+
+    monkeypatch.setattr(gff, 'max_workers', 2)
+    pooled = gff._get_session()
+    assert pooled is not retried
+    assert pooled.get_adapter('https://example.com')._pool_maxsize == 2
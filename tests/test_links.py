@@ -0,0 +1,64 @@
+import json
+import os
+import socket
+import time
+
+import pytest
+import requests
+
+from conftest import gff
+
+
+@pytest.fixture
+def unreachable_site(monkeypatch, tmp_path):
+    '''
+    Points the module at a port nothing listens on, with an empty cache
+    '''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(gff, 'url', 'http://127.0.0.1:{}/data_library.html'.format(port))
+    monkeypatch.setattr(gff, 'cache_dir', str(tmp_path))
+    monkeypatch.setattr(gff, 'request_retries', 0)
+    monkeypatch.setattr(gff, '_session', None)
+    monkeypatch.setattr(gff, '_factor_links', None)
+    return tmp_path
+
+
+def write_manifest(cache_dir, age):
+    manifest = {'ff' : {'csv_links' : ['ff.zip']},
+                'mom' : {'csv_links' : ['mom.zip']},
+                'scraped_at' : time.time() - age}
+    with open(os.path.join(str(cache_dir), 'factor_links.json'), 'w') as fh:
+        json.dump(manifest, fh)
+    return manifest
+
+
+def test_fresh_manifest_is_read_from_disk(unreachable_site):
+    manifest = write_manifest(unreachable_site, age=60)
+
+    with gff.profileLoads() as events:
+        assert gff._get_factor_links() == manifest
+        assert gff._get_factor_links() == manifest
+    assert [event['cache'] for event in events] == ['disk', 'memory']
+
+
+def test_expired_manifest_is_used_when_site_is_down(unreachable_site):
+    manifest = write_manifest(unreachable_site, age=2 * 24 * 60 * 60)
+
+    with gff.profileLoads() as events:
+        assert gff._get_factor_links() == manifest
+    assert events[0]['cache'] == 'stale'
+    assert 'error' not in events[0]
+
+
+def test_expired_memoised_links_are_used_when_site_is_down(unreachable_site, monkeypatch):
+    manifest = {'ff' : {}, 'mom' : {}, 'scraped_at' : time.time() - 2 * 24 * 60 * 60}
+    monkeypatch.setattr(gff, '_factor_links', manifest)
+
+    assert gff._get_factor_links() is manifest
+
+
+def test_missing_manifest_raises_when_site_is_down(unreachable_site):
+    with pytest.raises(requests.exceptions.ConnectionError):
+        gff._get_factor_links()
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from conftest import gff
+
+
+def test_default_panel_leaves_out_carhart4(offline_library, tmp_path):
+    path = gff.publishFactorPanel(str(tmp_path / 'panel'), frequencies=['m', 'a'])
+    factors = gff.attachFactorPanel(path)
+
+    assert sorted(factors) == [('ff3', 'a'), ('ff3', 'm'), ('ff5', 'a'), ('ff5', 'm'),
+                               ('mom', 'a'), ('mom', 'm')]
+
+
+def test_attached_frames_match_loaders(offline_library, tmp_path):
+    path = gff.publishFactorPanel(str(tmp_path / 'panel'), models=['carhart4', 'ff5'],
+                                  frequencies='m')
+    factors = gff.attachFactorPanel(path)
+
+    assert sorted(factors) == [('carhart4', 'm'), ('ff5', 'm')]
+    pd.testing.assert_frame_equal(factors[('carhart4', 'm')], gff.carhart4Factor('m'))
+    pd.testing.assert_frame_equal(factors[('ff5', 'm')], gff.famaFrench5Factor('m'))
+
+
+def test_attached_frames_are_read_only_views(offline_library, tmp_path):
+    path = gff.publishFactorPanel(str(tmp_path / 'panel'), models='ff3',
+                                  frequencies='m')
+    frame = gff.attachFactorPanel(path)[('ff3', 'm')]
+
+    values = frame['SMB'].to_numpy()
+    assert not values.flags.writeable
+
+
+def test_float32_panel(offline_library, tmp_path):
+    path = gff.publishFactorPanel(str(tmp_path / 'panel'), models=['ff3'],
+                                  frequencies='m', float32=True)
+    frame = gff.attachFactorPanel(path)[('ff3', 'm')]
+
+    assert (frame.dtypes.iloc[1:] == np.float32).all()
+    np.testing.assert_allclose(frame['SMB'], gff.famaFrench3Factor('m')['SMB'], rtol=1e-6)
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import edit_fixture, gff, read_fixture
+
+
+def test_monthly_file_splits_into_monthly_and_annual_sections():
+    sections = gff._parse_factor_file(read_fixture('F-F_Research_Data_Factors_CSV.zip'))
+
+    assert sorted(sections) == ['a', 'm']
+    for section in sections.values():
+        assert list(section.columns) == ['Date', 'Mkt-RF', 'SMB', 'HML', 'RF']
+        assert section['Date'].dtype == 'datetime64[ns]'
+        assert (section.dtypes.iloc[1:] == np.float64).all()
+
+
+def test_monthly_section_is_dated_at_month_end():
+    monthly = gff._parse_factor_file(read_fixture('F-F_Research_Data_Factors_CSV.zip'))['m']
+
+    expected = pd.to_datetime(['1926-07-31', '1926-08-31', '1926-09-30', '1928-02-29'])
+    assert list(monthly['Date']) == list(expected)
+    np.testing.assert_allclose(monthly.iloc[0, 1:].to_numpy(float),
+                               [0.0296, -0.0256, -0.0243, 0.0022])
+    # The last row before the annual block is kept
+    np.testing.assert_allclose(monthly.iloc[-1, 1:].to_numpy(float),
+                               [-0.0105, 0.0021, -0.0048, 0.0033])
+
+
+def test_annual_section_is_dated_at_year_end_and_skips_footer():
+    annual = gff._parse_factor_file(read_fixture('F-F_Research_Data_Factors_CSV.zip'))['a']
+
+    assert list(annual['Date']) == list(pd.to_datetime(['1927-12-31', '1928-12-31']))
+    np.testing.assert_allclose(annual.iloc[:, 1:].to_numpy(float),
+                               [[0.2947, -0.0246, -0.0375, 0.0312],
+                                [0.3539, 0.0441, -0.0583, 0.0356]])
+
+
+def test_daily_file_keeps_last_row():
+    daily = gff._parse_factor_file(read_fixture('F-F_Momentum_Factor_daily_CSV.zip'))['d']
+
+    assert list(daily.columns) == ['Date', 'Mom']
+    assert list(daily['Date']) == list(pd.to_datetime(['1926-11-03', '1926-11-04', '1928-02-29']))
+    np.testing.assert_allclose(daily['Mom'], [0.0056, -0.0050, 0.0010])
+
+
+def test_loaders_serve_both_sections_from_one_file(offline_library):
+    monthly = gff.famaFrench3Factor('m')
+    annual = gff.famaFrench3Factor('a')
+
+    assert len(monthly) == 4
+    assert len(annual) == 2
+    assert sorted(gff._parsed) == [('ff3', 'a'), ('ff3', 'm')]
+
+
+def test_loaders_return_copies(offline_library):
+    monthly = gff.famaFrench3Factor('m')
+    monthly.loc[0, 'SMB'] = 1.0
+
+    assert gff.famaFrench3Factor('m').loc[0, 'SMB'] == pytest.approx(-0.0256)
+
+
+def test_momentum_column_is_renamed(offline_library):
+    assert list(gff.momentumFactor('d').columns) == ['Date', 'MOM']
+
+
+def test_missing_section_raises_value_error(offline_library):
+    # Serve the monthly file where the daily one is expected
+    gff._factor_links['ff']['csv_links'][2] = 'fixture:F-F_Research_Data_Factors_CSV.zip'
+
+    with pytest.raises(ValueError, match="No 'd' section found for ff3 in fixture:"):
+        gff.famaFrench3Factor('d')
+
+
+def test_missing_value_codes_are_nan():
+    raw = edit_fixture('F-F_Research_Data_Factors_CSV.zip',
+                       ('192608,    2.64,   -1.17,', '192608,    2.64,  -99.99,'),
+                       ('  1927,   29.47,', '  1927,    -999,'))
+    sections = gff._parse_factor_file(raw)
+
+    assert np.isnan(sections['m'].loc[1, 'SMB'])
+    assert np.isnan(sections['a'].loc[0, 'Mkt-RF'])
+    assert sections['m'].drop(index=1).notna().all().all()
+
+
+@pytest.mark.parametrize('old, new', [('192609,', '192613,'), ('192608,', '192600,')])
+def test_invalid_month_raises(old, new):
+    raw = edit_fixture('F-F_Research_Data_Factors_CSV.zip', (old, new))
+
+    with pytest.raises(ValueError, match=new.rstrip(',')):
+        gff._parse_factor_file(raw)
+
+
+@pytest.mark.parametrize('code', ['19261131', '19270229', '19261100', '19261301'])
+def test_invalid_day_raises(code):
+    raw = edit_fixture('F-F_Momentum_Factor_daily_CSV.zip', ('19261104', code))
+
+    with pytest.raises(ValueError, match=code):
+        gff._parse_factor_file(raw)
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import gff
+
+N_DATES = 120
+FACTORS = ['Mkt-RF', 'SMB', 'HML']
+# Error allowed against lstsq; the normal equations of short rolling
+# windows with gaps are less well conditioned than a full sample fit
+FULL_ATOL = 1e-14
+WINDOW_ATOL = 2e-14
+
+
+@pytest.fixture
+def sample():
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('1990-01-31', periods=N_DATES, freq='ME')
+    factors = pd.DataFrame(rng.normal(0.0, 0.04, (N_DATES, len(FACTORS))),
+                           columns=FACTORS)
+    factors.insert(0, 'Date', dates)
+    factors['RF'] = rng.uniform(0.0, 0.004, N_DATES)
+
+    betas = rng.normal(1.0, 0.5, (len(FACTORS), 5))
+    excess = factors[FACTORS].to_numpy() @ betas + rng.normal(0.0, 0.02, (N_DATES, 5))
+    returns = pd.DataFrame(excess + factors[['RF']].to_numpy(), index=dates,
+                           columns=['A', 'B', 'C', 'D', 'E'])
+    # Late listing, early delisting and scattered gaps
+    returns.iloc[:30, 1] = np.nan
+    returns.iloc[90:, 2] = np.nan
+    returns.iloc[rng.choice(N_DATES, 15, replace=False), 3] = np.nan
+    return returns, factors
+
+
+def lstsq_fit(returns, factors, rows):
+    '''
+    Reference fit of each asset on its own observed dates within rows
+    '''
+    X = np.column_stack([np.ones(N_DATES), factors[FACTORS].to_numpy()])[rows]
+    Y = (returns.to_numpy() - factors[['RF']].to_numpy())[rows]
+    params = np.full((Y.shape[1], X.shape[1]), np.nan)
+    nobs = np.zeros(Y.shape[1], dtype=np.int64)
+    for asset in range(Y.shape[1]):
+        observed = ~np.isnan(Y[:, asset])
+        params[asset] = np.linalg.lstsq(X[observed], Y[observed, asset], rcond=None)[0]
+        nobs[asset] = observed.sum()
+    return params, nobs
+
+
+def test_factor_regression_matches_lstsq(sample):
+    returns, factors = sample
+    fit = gff.factorRegression(returns, factors)
+    params, nobs = lstsq_fit(returns, factors, slice(None))
+
+    assert list(fit['factors']) == FACTORS
+    np.testing.assert_array_equal(fit['nobs'], nobs)
+    np.testing.assert_allclose(fit['alpha'], params[:, 0], rtol=0, atol=FULL_ATOL)
+    np.testing.assert_allclose(fit['beta'], params[:, 1:], rtol=0, atol=FULL_ATOL)
+
+
+def test_factor_regression_r2_matches_lstsq(sample):
+    returns, factors = sample
+    fit = gff.factorRegression(returns, factors)
+    params, _ = lstsq_fit(returns, factors, slice(None))
+
+    X = np.column_stack([np.ones(N_DATES), factors[FACTORS].to_numpy()])
+    Y = returns.to_numpy() - factors[['RF']].to_numpy()
+    for asset in range(Y.shape[1]):
+        observed = ~np.isnan(Y[:, asset])
+        y = Y[observed, asset]
+        residuals = y - X[observed] @ params[asset]
+        r2 = 1 - residuals @ residuals / ((y - y.mean()) @ (y - y.mean()))
+        assert fit['r2'][asset] == pytest.approx(r2, abs=1e-12)
+
+
+def test_rolling_betas_match_lstsq(sample):
+    returns, factors = sample
+    window = 24
+    rolling = gff.rollingFactorBetas(returns, factors, window=window)
+
+    for step in range(N_DATES):
+        rows = slice(max(0, step + 1 - window), step + 1)
+        params, nobs = lstsq_fit(returns, factors, rows)
+        np.testing.assert_array_equal(rolling['nobs'][step], nobs)
+        fitted = nobs >= window
+        assert np.isnan(rolling['alpha'][step, ~fitted]).all()
+        np.testing.assert_allclose(rolling['alpha'][step, fitted], params[fitted, 0],
+                                   rtol=0, atol=WINDOW_ATOL)
+        np.testing.assert_allclose(rolling['beta'][step, fitted], params[fitted, 1:],
+                                   rtol=0, atol=WINDOW_ATOL)
+
+
+def test_expanding_betas_match_lstsq(sample):
+    returns, factors = sample
+    rolling = gff.rollingFactorBetas(returns, factors, window=None, min_periods=12)
+
+    for step in range(11, N_DATES):
+        params, nobs = lstsq_fit(returns, factors, slice(0, step + 1))
+        fitted = nobs >= 12
+        assert np.isnan(rolling['beta'][step, ~fitted]).all()
+        np.testing.assert_allclose(rolling['beta'][step, fitted], params[fitted, 1:],
+                                   rtol=0, atol=WINDOW_ATOL)
+    # Expanding windows never drop a period, so none are kept
+    assert len(rolling['model']._rows) == 0
+
+
+@pytest.mark.parametrize('window, min_periods', [(3, None), (4, None), (24, 25)])
+def test_window_that_can_never_fit_raises(window, min_periods):
+    with pytest.raises(ValueError):
+        gff.RollingFactorRegression(2, 4, window=window, min_periods=min_periods)
+
+
+def test_short_min_periods_is_raised_to_parameter_count():
+    model = gff.RollingFactorRegression(2, 4, window=5, min_periods=1)
+
+    assert model.min_periods == 5
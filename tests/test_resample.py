@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import gff
+
+FACTORS = ['Mkt-RF', 'SMB', 'HML', 'RF']
+
+
+@pytest.fixture
+def daily():
+    rng = np.random.default_rng(1)
+    dates = pd.bdate_range('2019-12-02', '2021-02-26')
+    factors = pd.DataFrame(rng.normal(0.0003, 0.01, (len(dates), len(FACTORS))),
+                           columns=FACTORS)
+    factors['RF'] = rng.uniform(0.0, 0.0002, len(dates))
+    factors.insert(0, 'Date', dates)
+    return factors
+
+
+def compound(daily, rule, columns):
+    '''
+    Reference compounding with pandas resampling
+    '''
+    growth = 1 + daily.set_index('Date')[columns]
+    return growth.resample(rule).prod() - 1
+
+
+def assert_matches(resampled, expected):
+    assert list(resampled['Date']) == list(expected.index)
+    np.testing.assert_allclose(resampled[expected.columns].to_numpy(),
+                               expected.to_numpy(), rtol=0, atol=1e-13)
+
+
+def test_weekly_factors(daily):
+    factors = daily.drop(columns='Mkt-RF')
+    resampled = gff.resampleFactors(factors, 'w', week_end='WED')
+
+    assert_matches(resampled, compound(factors, 'W-WED', ['SMB', 'HML', 'RF']))
+
+
+def test_fiscal_quarters(daily):
+    factors = daily.drop(columns='Mkt-RF')
+    resampled = gff.resampleFactors(factors, 'q', fiscal_year_end=8)
+
+    # Quarters of a year ending in August end in Nov, Feb, May and Aug
+    expected = compound(factors, 'QE-NOV', ['SMB', 'HML', 'RF'])
+    assert_matches(resampled, expected)
+
+
+def test_fiscal_years(daily):
+    factors = daily.drop(columns='Mkt-RF')
+    resampled = gff.resampleFactors(factors, 'a', fiscal_year_end=6)
+
+    assert_matches(resampled, compound(factors, 'YE-JUN', ['SMB', 'HML', 'RF']))
+
+
+def test_market_excess_is_rebuilt_from_compounded_market(daily):
+    resampled = gff.resampleFactors(daily, 'm')
+
+    market = daily.assign(Mkt=daily['Mkt-RF'] + daily['RF'])
+    expected = compound(market, 'ME', ['Mkt', 'SMB', 'HML', 'RF'])
+    expected['Mkt-RF'] = expected.pop('Mkt') - expected['RF']
+    assert_matches(resampled, expected)
+    # Compounding the excess return directly would be biased
+    naive = compound(daily, 'ME', ['Mkt-RF'])
+    assert not np.allclose(resampled['Mkt-RF'], naive['Mkt-RF'], rtol=0, atol=1e-8)
+
+
+def test_missing_day_makes_its_period_missing(daily):
+    daily.loc[daily['Date'] == '2020-03-16', 'SMB'] = np.nan
+    resampled = gff.resampleFactors(daily, 'm').set_index('Date')
+
+    assert np.isnan(resampled.loc['2020-03-31', 'SMB'])
+    assert not resampled.drop(index=pd.Timestamp('2020-03-31')).isna().any().any()
+    assert not resampled.loc['2020-03-31', ['Mkt-RF', 'HML', 'RF']].isna().any()
+
+
+def test_derived_monthly_factors_reconcile(offline_library):
+    derived, deviations = gff.deriveFactors('ff3', 'm', reconcile=True)
+
+    assert list(derived['Date']) == list(pd.to_datetime(['1926-07-31', '1926-08-31',
+                                                         '1926-09-30']))
+    assert list(deviations.index) == FACTORS
+    # Daily files are rounded to 0.01%, so months match to about that
+    assert (deviations < 1e-4).all()
+
+
+def test_reconcile_needs_a_published_frequency(offline_library):
+    with pytest.raises(ValueError):
+        gff.deriveFactors('ff3', 'q', reconcile=True)
@@ -0,0 +1,106 @@
+import pandas as pd
+import pytest
+
+from conftest import edit_fixture, gff
+
+pytest.importorskip('pyarrow')
+
+MONTHLY = 'F-F_Research_Data_Factors_CSV.zip'
+
+
+@pytest.fixture
+def library(offline_library, monkeypatch):
+    # Every load sees the file currently published
+    monkeypatch.setattr(gff, 'cache_ttl', 0)
+    return offline_library
+
+
+def test_first_refresh_stores_everything(library):
+    changes = gff.refreshFactors('ff3', 'm')
+
+    assert len(changes['appended']) == 4
+    assert changes['revised'].empty
+    assert list(changes['revised'].columns) == ['Date', 'Factor', 'Stored', 'New']
+    assert changes['added_columns'] == changes['dropped_columns'] == []
+    assert changes['years'] == [1926, 1928]
+    pd.testing.assert_frame_equal(gff.readFactorStore('ff3', 'm'),
+                                  gff.famaFrench3Factor('m'))
+
+
+def test_unchanged_file_is_a_no_op(library):
+    gff.refreshFactors('ff3', 'm')
+    changes = gff.refreshFactors('ff3', 'm')
+
+    assert changes['appended'].empty
+    assert changes['revised'].empty
+    assert changes['years'] == []
+
+
+def test_new_rows_are_appended(library):
+    gff.refreshFactors('ff3', 'm')
+    library[MONTHLY] = edit_fixture(
+        MONTHLY, ('192802,   -1.05,    0.21,   -0.48,    0.33\r\n',
+                  '192802,   -1.05,    0.21,   -0.48,    0.33\r\n'
+                  '192803,    1.00,    2.00,    3.00,    0.30\r\n'))
+    changes = gff.refreshFactors('ff3', 'm')
+
+    assert list(changes['appended']['Date']) == [pd.Timestamp('1928-03-31')]
+    assert changes['revised'].empty
+    assert changes['years'] == [1928]
+    assert len(gff.readFactorStore('ff3', 'm')) == 5
+
+
+def test_revised_value_rewrites_only_its_year(library):
+    gff.refreshFactors('ff3', 'm')
+    library[MONTHLY] = edit_fixture(
+        MONTHLY, ('192608,    2.64,   -1.17,', '192608,    2.64,   -1.20,'))
+    changes = gff.refreshFactors('ff3', 'm')
+
+    assert changes['appended'].empty
+    revised = changes['revised']
+    assert len(revised) == 1
+    assert revised.loc[0, 'Date'] == pd.Timestamp('1926-08-31')
+    assert revised.loc[0, 'Factor'] == 'SMB'
+    assert revised.loc[0, 'Stored'] == pytest.approx(-0.0117)
+    assert revised.loc[0, 'New'] == pytest.approx(-0.0120)
+    assert changes['years'] == [1926]
+    stored = gff.readFactorStore('ff3', 'm')
+    assert stored.loc[1, 'SMB'] == pytest.approx(-0.0120)
+
+
+def test_renamed_column_is_reported(library):
+    gff.refreshFactors('ff3', 'm')
+    library[MONTHLY] = edit_fixture(MONTHLY, (',Mkt-RF,SMB,HML,RF', ',Mkt-RF,SMB,HML2,RF'))
+    changes = gff.refreshFactors('ff3', 'm')
+
+    assert changes['added_columns'] == ['HML2']
+    assert changes['dropped_columns'] == ['HML']
+    assert changes['revised'].empty
+    assert changes['years'] == [1926, 1928]
+    assert list(gff.readFactorStore('ff3', 'm').columns) == ['Date', 'Mkt-RF', 'SMB',
+                                                             'HML2', 'RF']
+
+
+def test_read_since_skips_earlier_rows(library):
+    gff.refreshFactors('ff3', 'm')
+
+    assert list(gff.readFactorStore('ff3', 'm', since='1926-09-01')['Date']) == [
+        pd.Timestamp('1926-09-30'), pd.Timestamp('1928-02-29')]
+    assert list(gff.readFactorStore('ff3', 'm', since='1927-01-01')['Date']) == [
+        pd.Timestamp('1928-02-29')]
+
+
+def test_empty_store_reads_as_empty_frame(library):
+    assert gff.readFactorStore('ff3', 'm').empty
+
+
+def test_renaming_the_only_column_is_reported(library):
+    gff.refreshFactors('mom', 'd')
+    daily = 'F-F_Momentum_Factor_daily_CSV.zip'
+    library[daily] = edit_fixture(daily, (',Mom ', ',UMD '))
+    changes = gff.refreshFactors('mom', 'd')
+
+    assert changes['added_columns'] == ['UMD']
+    assert changes['dropped_columns'] == ['MOM']
+    assert changes['revised'].empty
+    assert changes['years'] == [1926, 1928]
@@ -0,0 +1,81 @@
+import pytest
+
+from conftest import gff
+
+
+def test_load_reports_each_phase(offline_library):
+    with gff.profileLoads() as events:
+        gff.famaFrench3Factor('m')
+
+    phases = [event['phase'] for event in events]
+    assert phases == ['links', 'decompress', 'parse', 'dates', 'parse', 'dates', 'load']
+    links, decompress, parse, dates = events[:4]
+    assert links['cache'] == 'memory'
+    assert links['url'] == gff.url
+    assert decompress['dataset'] == 'ff3'
+    assert decompress['bytes'] > 0
+    assert (parse['frequency'], parse['rows']) == ('m', 4)
+    assert (dates['frequency'], dates['rows']) == ('m', 4)
+    assert events[-1]['cache'] == 'miss'
+    assert events[-1]['frequency'] == 'm'
+    for event in events:
+        assert event['seconds'] >= 0
+        assert 'error' not in event
+
+
+def test_memoised_load_reports_memory(offline_library):
+    gff.famaFrench3Factor('m')
+    with gff.profileLoads() as events:
+        gff.famaFrench3Factor('a')
+
+    assert [event['phase'] for event in events] == ['links', 'load']
+    assert events[-1]['cache'] == 'memory'
+
+
+def test_carhart_reports_merge(offline_library):
+    with gff.profileLoads() as events:
+        gff.carhart4Factor('d')
+
+    merge = [event for event in events if event['phase'] == 'merge']
+    assert len(merge) == 1
+    assert merge[0]['dataset'] == 'carhart4'
+    assert merge[0]['rows'] == 8  # Every 3 factor day, MOM where known
+
+
+def test_failed_phase_reports_error(offline_library, monkeypatch):
+    def unreachable(file_url):
+        raise ConnectionError('site down')
+
+    monkeypatch.setattr(gff, '_download', unreachable)
+    with gff.profileLoads() as events:
+        with pytest.raises(ConnectionError):
+            gff.famaFrench3Factor('m')
+
+    load = events[-1]
+    assert load['phase'] == 'load'
+    assert load['error'] == 'ConnectionError: site down'
+    assert load['seconds'] >= 0
+
+
+def test_links_callback_runs_outside_links_lock(offline_library):
+    held = []
+
+    def callback(event):
+        if event['phase'] == 'links':
+            held.append(gff._links_lock.locked())
+
+    gff.addTimingCallback(callback)
+    try:
+        gff.famaFrench3Factor('m')
+    finally:
+        gff.removeTimingCallback(callback)
+    assert held == [False]
+
+
+def test_removed_callback_is_not_called(offline_library):
+    events = []
+    gff.addTimingCallback(events.append)
+    gff.removeTimingCallback(events.append)
+    gff.famaFrench3Factor('m')
+
+    assert events == []